@@ -1,11 +1,20 @@
+import base64
+import time
+import orjson
 from datetime import datetime, timedelta, timezone
-from jose import JWTError, jwt
+from jose import JWTError, ExpiredSignatureError, jwk, jwt
+from jose.exceptions import JWTClaimsError
 from passlib.context import CryptContext
 
 SECRET_KEY = "supersecretkey123"
 ALGORITHM = "HS256"
 ACCESS_TOKEN_EXPIRE_MINUTES = 60
 
+# Key object built once instead of on every jwt.decode call
+_VERIFIER = jwk.construct(SECRET_KEY, ALGORITHM)
+
+# pbkdf2_sha256 (passlib default rounds) verifies in a few ms; bcrypt-12 or argon2id
+# would make /login slower, so the existing hashes and cost are kept as they are
 pwd_context = CryptContext(
     schemes=["pbkdf2_sha256"],
     deprecated="auto"
@@ -24,3 +33,72 @@ def create_access_token(data: dict):
     expire = datetime.now(timezone.utc) + timedelta(minutes=ACCESS_TOKEN_EXPIRE_MINUTES)
     to_encode.update({"exp": expire})
     return jwt.encode(to_encode, SECRET_KEY, algorithm=ALGORITHM)
+
+
+def _b64decode(segment: str):
+    return base64.urlsafe_b64decode(segment + "=" * (-len(segment) % 4))
+
+
+# Time claims are coerced with int() as jwt.decode does (so "1700000000" is accepted),
+# except that bools and non-scalar values are rejected instead of being coerced or
+# raising TypeError
+def _numeric_claim(payload: dict, name: str):
+    if name not in payload:
+        return None
+
+    value = payload[name]
+    if isinstance(value, bool):
+        raise JWTClaimsError(f"Invalid {name} claim")
+
+    try:
+        return int(value)
+    except (TypeError, ValueError):
+        raise JWTClaimsError(f"Invalid {name} claim")
+
+
+def decode_access_token(token: str):
+    try:
+        signing_input, signature_b64 = token.rsplit(".", 1)
+        header_b64, payload_b64 = signing_input.split(".")
+        header = orjson.loads(_b64decode(header_b64))
+        payload = orjson.loads(_b64decode(payload_b64))
+        signature = _b64decode(signature_b64)
+    except ValueError:
+        raise JWTError("Invalid token")
+
+    if not isinstance(header, dict) or not isinstance(payload, dict):
+        raise JWTError("Invalid token")
+
+    if header.get("alg") != ALGORITHM:
+        raise JWTError("Invalid algorithm")
+
+    if not _VERIFIER.verify(signing_input.encode(), signature):
+        raise JWTError("Signature verification failed")
+
+    now = int(time.time())
+
+    _numeric_claim(payload, "iat")
+
+    nbf = _numeric_claim(payload, "nbf")
+    if nbf is not None and nbf > now:
+        raise JWTClaimsError("The token is not yet valid (nbf)")
+
+    exp = _numeric_claim(payload, "exp")
+    if exp is not None and exp < now:
+        raise ExpiredSignatureError("Signature has expired")
+
+    # jwt.decode is called without an expected audience or access token, so any
+    # aud or at_hash claim fails there; iss and sub are only compared when expected
+    if "aud" in payload:
+        raise JWTClaimsError("Invalid audience")
+
+    if "sub" in payload and not isinstance(payload["sub"], str):
+        raise JWTClaimsError("Subject must be a string")
+
+    if "jti" in payload and not isinstance(payload["jti"], str):
+        raise JWTClaimsError("JWT ID must be a string")
+
+    if "at_hash" in payload:
+        raise JWTClaimsError("No access_token provided to compare against at_hash claim")
+
+    return payload
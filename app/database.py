@@ -1,10 +1,76 @@
 import os
-from sqlalchemy import create_engine
+from sqlalchemy import create_engine, make_url
+from sqlalchemy.ext.asyncio import create_async_engine, async_sessionmaker
 from sqlalchemy.orm import sessionmaker, declarative_base
 
 DATABASE_URL = os.getenv("DATABASE_URL")
 
-engine = create_engine(DATABASE_URL, pool_pre_ping=True)
+# Prefer the mysqlclient C driver (requirements-mysqlclient.txt) over pure-Python PyMySQL when it is installed
+try:
+    import MySQLdb  # noqa: F401
+except ImportError:
+    pass
+else:
+    if DATABASE_URL and DATABASE_URL.startswith("mysql+pymysql://"):
+        DATABASE_URL = "mysql+mysqldb://" + DATABASE_URL[len("mysql+pymysql://"):]
+
+# Async drivers for the authenticated endpoints, keyed by the sync URL's driver name
+ASYNC_DRIVERS = {
+    "mysql": "mysql+asyncmy",
+    "mysql+pymysql": "mysql+asyncmy",
+    "mysql+mysqldb": "mysql+asyncmy",
+    "postgres": "postgresql+asyncpg",
+    "postgresql": "postgresql+asyncpg",
+    "postgresql+psycopg2": "postgresql+asyncpg",
+    "sqlite": "sqlite+aiosqlite",
+    "sqlite+pysqlite": "sqlite+aiosqlite",
+}
+
+# libpq-only query parameters that asyncpg rejects; None means drop it
+ASYNCPG_QUERY_PARAMS = {
+    "sslmode": "ssl",
+    "channel_binding": None,
+}
+
+
+def to_async_url(url: str):
+    url = make_url(url)
+
+    if url.drivername not in ASYNC_DRIVERS:
+        raise RuntimeError(
+            f"No async driver configured for DATABASE_URL scheme '{url.drivername}'"
+        )
+
+    url = url.set(drivername=ASYNC_DRIVERS[url.drivername])
+
+    if url.drivername == "postgresql+asyncpg":
+        query = {}
+        for key, value in url.query.items():
+            key = ASYNCPG_QUERY_PARAMS.get(key, key)
+            if key is not None:
+                query[key] = value
+        url = url.set(query=query)
+
+    return url
+
+
+def pool_options(url, pool_size, max_overflow):
+    # SQLite uses a single-connection pool that takes none of these options
+    if make_url(url).get_backend_name() == "sqlite":
+        return {}
+
+    return dict(
+        pool_size=pool_size,
+        max_overflow=max_overflow,
+        pool_recycle=1800,
+        pool_pre_ping=True,
+        pool_timeout=10
+    )
+
+
+# The sync pool only serves register/login/password reset; authenticated
+# endpoints use the async pool. At most 45 connections per worker.
+engine = create_engine(DATABASE_URL, **pool_options(DATABASE_URL, 5, 5))
 
 SessionLocal = sessionmaker(
     autocommit=False,
@@ -12,4 +78,17 @@ SessionLocal = sessionmaker(
     bind=engine
 )
 
+ASYNC_DATABASE_URL = to_async_url(DATABASE_URL)
+
+async_engine = create_async_engine(
+    ASYNC_DATABASE_URL,
+    **pool_options(ASYNC_DATABASE_URL, 15, 20)
+)
+
+AsyncSessionLocal = async_sessionmaker(
+    autoflush=False,
+    expire_on_commit=False,
+    bind=async_engine
+)
+
 Base = declarative_base()
\ No newline at end of file
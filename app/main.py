@@ -1,30 +1,113 @@
-from fastapi import FastAPI, Depends, HTTPException, Request, Query, Body
+from fastapi import FastAPI, Depends, HTTPException, Request, Response, Query, Body
 from fastapi.security import HTTPBearer, HTTPAuthorizationCredentials, OAuth2PasswordRequestForm
-from fastapi.responses import HTMLResponse
+from fastapi.responses import HTMLResponse, ORJSONResponse
 from fastapi.staticfiles import StaticFiles
-from jose import JWTError, jwt
+from jose import JWTError
 from sqlalchemy.orm import Session
+from sqlalchemy.ext.asyncio import AsyncSession
 from fastapi.templating import Jinja2Templates
-from sqlalchemy import extract
+from sqlalchemy import delete, extract, exists, func, insert, inspect, literal, select
+from sqlalchemy.exc import IntegrityError, NoSuchTableError
 from datetime import date, datetime, time
-from .database import engine, SessionLocal
+from .database import engine, SessionLocal, AsyncSessionLocal
 from . import models, schemas
+import os
 import secrets
 import ipaddress
-from .auth import create_access_token, SECRET_KEY, ALGORITHM, verify_password, hash_password
+import hashlib
+import orjson
+import time as time_module
+import threading
+from cachetools import TTLCache
+from jinja2 import Environment, FileSystemBytecodeCache, FileSystemLoader
+from .auth import create_access_token, decode_access_token, verify_password, hash_password
+
+# Schema creation and admin seeding run only where RUN_MIGRATIONS=1,
+# so a multi-worker deployment doesn't repeat them in every process
+RUN_MIGRATIONS = os.getenv("RUN_MIGRATIONS") == "1"
+
+ATTENDANCE_UNIQUE_INDEX = "ix_attendance_user_date"
+
+
+def attendance_index_exists(bind=engine):
+    try:
+        indexes = inspect(bind).get_indexes(models.Attendance.__tablename__)
+    except NoSuchTableError:
+        return False
+
+    return any(index["name"] == ATTENDANCE_UNIQUE_INDEX for index in indexes)
+
+
+# create_all never adds indexes to an existing table, so older databases
+# get their duplicate marks removed and the (user_id, date) indexes created here
+def migrate_attendance_indexes():
+    if not attendance_index_exists():
+        keep = select(
+            func.min(models.Attendance.id).label("keep_id")
+        ).group_by(
+            models.Attendance.user_id,
+            models.Attendance.date
+        ).subquery()
+
+        with engine.begin() as conn:
+            conn.execute(
+                delete(models.Attendance).where(
+                    models.Attendance.user_id.isnot(None),
+                    models.Attendance.date.isnot(None),
+                    models.Attendance.id.not_in(select(keep.c.keep_id))
+                )
+            )
+
+    for index in models.Attendance.__table__.indexes:
+        index.create(bind=engine, checkfirst=True)
+
 
 # Create tables
-models.Base.metadata.create_all(bind=engine)
+if RUN_MIGRATIONS:
+    models.Base.metadata.create_all(bind=engine)
+    migrate_attendance_indexes()
+
+# Until the unique index exists, mark_attendance checks for today's row itself.
+# Probed lazily from requests (at most once a minute) rather than at startup.
+ATTENDANCE_INDEX_RECHECK_SECONDS = 60
+_attendance_index_ready = False
+_attendance_index_checked_at = None
 
 security = HTTPBearer()
 
+# Verified tokens -> (user_id, exp), so repeat requests skip jwt.decode and the email lookup
+_jwt_cache = TTLCache(maxsize=10000, ttl=30)
+_jwt_lock = threading.Lock()
+
+# Networks allowed to mark attendance
+ALLOWED_NETWORKS = [ipaddress.ip_network("127.0.0.1/32")]
+_ALLOWED_HOSTS = {
+    str(network.network_address)
+    for network in ALLOWED_NETWORKS
+    if network.num_addresses == 1
+}
+
+# Admin dashboard results keyed by (endpoint, date); polled far more often than they change
+_dashboard_cache = TTLCache(maxsize=64, ttl=5)
+_dashboard_lock = threading.Lock()
+
 app = FastAPI(
     title="Attendance System",
     description="A secure attendance system",
-    version="1.0.0"
+    version="1.0.0",
+    default_response_class=ORJSONResponse
 )
 
-templates = Jinja2Templates(directory="templates")
+IS_PRODUCTION = os.getenv("APP_ENV") == "production"
+
+# Compiled templates are kept on disk so restarted workers skip the Jinja compiler.
+# Jinja's default cache dir is private to the current user and permission-checked.
+templates = Jinja2Templates(env=Environment(
+    loader=FileSystemLoader("templates"),
+    autoescape=True,
+    auto_reload=not IS_PRODUCTION,
+    bytecode_cache=FileSystemBytecodeCache()
+))
 
 
 app.mount("/static", StaticFiles(directory="static"), name="static")
@@ -58,22 +141,107 @@ def get_db():
     finally:
         db.close()
 
+async def get_async_db():
+    async with AsyncSessionLocal() as db:
+        yield db
+
+async def attendance_marked(db: AsyncSession, user_id: int, day: date):
+    return (await db.execute(select(exists().where(
+        models.Attendance.user_id == user_id,
+        models.Attendance.date == day
+    )))).scalar()
+
+async def attendance_index_ready(db: AsyncSession):
+    global _attendance_index_ready, _attendance_index_checked_at
+
+    if _attendance_index_ready:
+        return True
+
+    now = time_module.monotonic()
+    if (
+        _attendance_index_checked_at is None
+        or now - _attendance_index_checked_at >= ATTENDANCE_INDEX_RECHECK_SECONDS
+    ):
+        _attendance_index_checked_at = now
+        conn = await db.connection()
+        _attendance_index_ready = await conn.run_sync(attendance_index_exists)
+
+    return _attendance_index_ready
+
+
+def attendance_index_found():
+    global _attendance_index_ready
+    _attendance_index_ready = True
+
+# DASHBOARD CACHE
+
+def dashboard_cache_get(key):
+    with _dashboard_lock:
+        return _dashboard_cache.get(key)
+
+
+def dashboard_cache_set(key, value):
+    with _dashboard_lock:
+        _dashboard_cache[key] = value
+
+
+def dashboard_cache_invalidate(*keys):
+    with _dashboard_lock:
+        if not keys:
+            _dashboard_cache.clear()
+        for key in keys:
+            _dashboard_cache.pop(key, None)
+
+# If-None-Match may be "*" or a comma-separated list; compared weakly (W/ ignored)
+
+def etag_matches(if_none_match, etag):
+    if not if_none_match:
+        return False
+
+    candidates = [tag.strip() for tag in if_none_match.split(",")]
+    if "*" in candidates:
+        return True
+
+    opaque = etag.removeprefix("W/")
+    return any(tag.removeprefix("W/") == opaque for tag in candidates)
+
+# ETag + short browser caching for dashboard JSON; answers 304 when the client copy is current
+
+def conditional_response(request: Request, response: Response, body):
+    etag = 'W/"' + hashlib.blake2b(orjson.dumps(body), digest_size=8).hexdigest() + '"'
+    headers = {"ETag": etag, "Cache-Control": "private, max-age=5"}
+
+    if etag_matches(request.headers.get("if-none-match"), etag):
+        return Response(status_code=304, headers=headers)
+
+    response.headers.update(headers)
+    return body
+
 # AUTO CREATE DEFAULT ADMIN
 
 @app.on_event("startup")
 def create_default_admin():
+    if not RUN_MIGRATIONS:
+        return
+
+    # INSERT ... SELECT ... WHERE NOT EXISTS: a single statement, no prior lookup
+    default_admin = select(
+        literal("System Admin"),
+        literal("admin@school.com"),
+        literal(hash_password("Admin@123")),
+        literal("admin")
+    ).where(~exists().where(models.User.role == "admin"))
+
+    stmt = insert(models.User).from_select(
+        ["full_name", "email", "password", "role"],
+        default_admin
+    )
+
     db = SessionLocal()
-    admin_exists = db.query(models.User).filter(models.User.role == "admin").first()
-
-    if not admin_exists:
-        admin_user = models.User(
-            full_name="System Admin",
-            email="admin@school.com",
-            password=hash_password("Admin@123"),
-            role="admin"
-        )
-        db.add(admin_user)
-        db.commit()
+    created = db.execute(stmt).rowcount
+    db.commit()
+
+    if created:
         print("Default admin created: admin@school.com / Admin@123")
 
     db.close()
@@ -90,8 +258,8 @@ def register(user: schemas.UserCreate, db: Session = Depends(get_db)):
     if user.role.lower() == "admin":
         raise HTTPException(status_code=403, detail="Admin registration not allowed")
 
-    existing_user = db.query(models.User).filter(models.User.email == user.email).first()
-    if existing_user:
+    email_taken = db.query(exists().where(models.User.email == user.email)).scalar()
+    if email_taken:
         raise HTTPException(status_code=400, detail="Email already registered")
 
     new_user = models.User(
@@ -105,6 +273,8 @@ def register(user: schemas.UserCreate, db: Session = Depends(get_db)):
     db.commit()
     db.refresh(new_user)
 
+    dashboard_cache_invalidate()
+
     return {"message": "Staff registered successfully"}
 
 # LOGIN
@@ -134,9 +304,9 @@ def login(form_data: OAuth2PasswordRequestForm = Depends(), db: Session = Depend
 
 # GET CURRENT USER
 
-def get_current_user(
+async def get_current_user(
     credentials: HTTPAuthorizationCredentials = Depends(security),
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_async_db)
 ):
 
     token = credentials.credentials
@@ -146,8 +316,21 @@ def get_current_user(
         detail="Could not validate credentials"
     )
 
+    key = hashlib.sha256(token.encode()).hexdigest()
+    with _jwt_lock:
+        cached = _jwt_cache.get(key)
+
+    if cached is not None:
+        user_id, exp = cached
+        if exp > time_module.time():
+            user = await db.get(models.User, user_id)
+            if user is not None:
+                return user
+        with _jwt_lock:
+            _jwt_cache.pop(key, None)
+
     try:
-        payload = jwt.decode(token, SECRET_KEY, algorithms=[ALGORITHM])
+        payload = decode_access_token(token)
         email: str = payload.get("sub")
 
         if email is None:
@@ -156,16 +339,24 @@ def get_current_user(
     except JWTError:
         raise credentials_exception
 
-    user = db.query(models.User).filter(models.User.email == email).first()
+    user = (await db.execute(
+        select(models.User).where(models.User.email == email)
+    )).scalars().first()
 
     if user is None:
         raise credentials_exception
 
+    # decode_access_token has already checked exp converts with int()
+    exp = payload.get("exp")
+    if exp is not None:
+        with _jwt_lock:
+            _jwt_cache[key] = (user.id, int(exp))
+
     return user
 
 
 @app.get("/me")
-def get_me(current_user: models.User = Depends(get_current_user)):
+async def get_me(current_user: models.User = Depends(get_current_user)):
     return {
         "full_name": current_user.full_name,
         "role": current_user.role
@@ -174,18 +365,20 @@ def get_me(current_user: models.User = Depends(get_current_user)):
 # MARK ATTENDANCE (SECURED)
 
 @app.post("/mark-attendance")
-def mark_attendance(
+async def mark_attendance(
     request: Request,
     current_user: models.User = Depends(get_current_user),
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_async_db)
 ):
 
     # LOCATION RESTRICTION
-    allowed_network = ipaddress.ip_network("127.0.0.1/32")
-
-    client_ip = ipaddress.ip_address(request.client.host)
+    client_host = request.client.host
 
-    if client_ip not in allowed_network:
+    if client_host not in _ALLOWED_HOSTS and not any(
+        ipaddress.ip_address(client_host) in network
+        for network in ALLOWED_NETWORKS
+        if network.num_addresses > 1
+    ):
         raise HTTPException(
             status_code=403,
             detail="Attendance allowed only on school network"
@@ -194,17 +387,12 @@ def mark_attendance(
     if current_user.role != "staff":
         raise HTTPException(status_code=403, detail="Only staff can mark attendance")
 
+    # Read before any rollback, which expires current_user
+    user_id = current_user.id
+
     now = datetime.now()
     today = now.date()
 
-    existing = db.query(models.Attendance).filter(
-        models.Attendance.user_id == current_user.id,
-        models.Attendance.date == today
-    ).first()
-
-    if existing:
-        raise HTTPException(status_code=400, detail="Already marked today")
-
     late_time = time(7, 30)
     close_time = time(8, 00)
 
@@ -215,24 +403,38 @@ def mark_attendance(
     if now.time() > late_time:
         status = "Late"
 
+    if not await attendance_index_ready(db) and await attendance_marked(db, user_id, today):
+        raise HTTPException(status_code=400, detail="Already marked today")
+
     attendance = models.Attendance(
-        user_id=current_user.id,
+        user_id=user_id,
         date=today,
         check_in=now,
         status=status
     )
 
     db.add(attendance)
-    db.commit()
+
+    try:
+        await db.commit()
+    except IntegrityError as exc:
+        await db.rollback()
+        if ATTENDANCE_UNIQUE_INDEX in str(exc.orig):
+            attendance_index_found()
+        if await attendance_marked(db, user_id, today):
+            raise HTTPException(status_code=400, detail="Already marked today")
+        raise
+
+    dashboard_cache_invalidate(("daily-summary", today), ("absentees", today))
 
     return {"message": "Attendance marked", "status": status}
 
 # ABSENTEES (ADMIN ONLY)
 
 @app.get("/absentees")
-def get_absentees(
+async def get_absentees(
     current_user: models.User = Depends(get_current_user),
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_async_db)
 ):
 
     if current_user.role != "admin":
@@ -240,34 +442,64 @@ def get_absentees(
 
     today = datetime.now().date()
 
-    staff_users = db.query(models.User).filter(models.User.role == "staff").all()
-    attended = db.query(models.Attendance).filter(models.Attendance.date == today).all()
+    cache_key = ("absentees", today)
+    cached = dashboard_cache_get(cache_key)
+    if cached is not None:
+        return cached
 
-    attended_ids = [a.user_id for a in attended]
+    # NOT EXISTS rather than NOT IN: a NULL user_id in today's rows would make NOT IN match nobody
+    attended_today = exists().where(
+        models.Attendance.user_id == models.User.id,
+        models.Attendance.date == today
+    )
+
+    absent_users = (await db.execute(
+        select(
+            models.User.id,
+            models.User.full_name,
+            models.User.email
+        ).where(
+            models.User.role == "staff",
+            ~attended_today
+        )
+    )).all()
 
     absentees = [
         {"id": u.id, "full_name": u.full_name, "email": u.email}
-        for u in staff_users if u.id not in attended_ids
+        for u in absent_users
     ]
 
-    return {"date": str(today), "absentees": absentees}
+    result = {"date": today, "absentees": absentees}
+    dashboard_cache_set(cache_key, result)
+
+    return result
 
 @app.get("/my-attendance")
-def my_attendance(
+async def my_attendance(
+    limit: int = Query(100, ge=1, le=500),
+    offset: int = Query(0, ge=0),
     current_user: models.User = Depends(get_current_user),
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_async_db)
 ):
     if current_user.role != "staff":
         raise HTTPException(status_code=403, detail="Staff access required")
 
-    records = db.query(models.Attendance).filter(
-        models.Attendance.user_id == current_user.id
-    ).order_by(models.Attendance.date.desc()).all()
+    records = (await db.execute(
+        select(
+            models.Attendance.date,
+            models.Attendance.check_in,
+            models.Attendance.status
+        ).where(
+            models.Attendance.user_id == current_user.id
+        ).order_by(
+            models.Attendance.date.desc()
+        ).limit(limit).offset(offset)
+    )).all()
 
     return [
         {
-            "date": str(record.date),
-            "check_in": record.check_in.strftime("%H:%M:%S"),
+            "date": record.date,
+            "check_in": f"{record.check_in.hour:02d}:{record.check_in.minute:02d}:{record.check_in.second:02d}",
             "status": record.status
         }
         for record in records
@@ -306,9 +538,11 @@ def reset_password(token: str, new_password: str, db: Session = Depends(get_db))
     return {"message": "Password reset successful"}
 
 @app.get("/daily-summary")
-def daily_summary(
+async def daily_summary(
+    request: Request,
+    response: Response,
     current_user: models.User = Depends(get_current_user),
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_async_db)
 ):
 
     if current_user.role != "admin":
@@ -316,41 +550,65 @@ def daily_summary(
 
     today = date.today()
 
-    staff_users = db.query(models.User).filter(models.User.role == "staff").all()
+    cache_key = ("daily-summary", today)
+    cached = dashboard_cache_get(cache_key)
+    if cached is not None:
+        return conditional_response(request, response, cached)
+
+    total_staff = (await db.execute(
+        select(func.count()).select_from(models.User).where(
+            models.User.role == "staff"
+        )
+    )).scalar()
 
-    present = db.query(models.Attendance).filter(
-        models.Attendance.date == today,
-        models.Attendance.status == "Present"
-    ).all()
+    status_counts = dict((await db.execute(
+        select(models.Attendance.status, func.count()).where(
+            models.Attendance.date == today
+        ).group_by(models.Attendance.status)
+    )).all())
 
-    late = db.query(models.Attendance).filter(
-        models.Attendance.date == today,
-        models.Attendance.status == "Late"
-    ).all()
+    present_count = status_counts.get("Present", 0)
+    late_count = status_counts.get("Late", 0)
 
-    absent_count = len(staff_users) - len(present) - len(late)
+    absent_count = total_staff - present_count - late_count
 
-    return {
-        "total_staff": len(staff_users),
-        "present_count": len(present),
-        "late_count": len(late),
+    result = {
+        "total_staff": total_staff,
+        "present_count": present_count,
+        "late_count": late_count,
         "absent_count": absent_count
     }
+    dashboard_cache_set(cache_key, result)
+
+    return conditional_response(request, response, result)
 
 @app.get("/all-staff")
-def get_all_staff(
+async def get_all_staff(
+    request: Request,
+    response: Response,
     current_user: models.User = Depends(get_current_user),
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_async_db)
 ):
 
     if current_user.role != "admin":
         raise HTTPException(status_code=403, detail="Admins-only")
 
-    staff = db.query(models.User).filter(
-        models.User.role == "staff"
-    ).all()
+    cache_key = ("all-staff", None)
+    cached = dashboard_cache_get(cache_key)
+    if cached is not None:
+        return conditional_response(request, response, cached)
+
+    staff = (await db.execute(
+        select(
+            models.User.id,
+            models.User.full_name,
+            models.User.email
+        ).where(
+            models.User.role == "staff"
+        )
+    )).all()
 
-    return [
+    result = [
         {
             "id": user.id,
             "full_name": user.full_name,
@@ -358,60 +616,87 @@ def get_all_staff(
         }
         for user in staff
     ]
+    dashboard_cache_set(cache_key, result)
+
+    return conditional_response(request, response, result)
+
 @app.delete("/delete-staff/{staff_id}")
-def delete_staff(
+async def delete_staff(
     staff_id: int,
     current_user: models.User = Depends(get_current_user),
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_async_db)
 ):
 
     if current_user.role != "admin":
         raise HTTPException(status_code=403, detail="Admins only")
 
-    staff = db.query(models.User).filter(
-        models.User.id == staff_id,
-        models.User.role == "staff"
-    ).first()
+    staff = (await db.execute(
+        select(models.User).where(
+            models.User.id == staff_id,
+            models.User.role == "staff"
+        )
+    )).scalars().first()
 
     if not staff:
         raise HTTPException(status_code=404, detail="Staff not found")
 
     # Delete attendance records first
-    db.query(models.Attendance).filter(
-        models.Attendance.user_id == staff_id
-    ).delete()
+    await db.execute(
+        delete(models.Attendance).where(
+            models.Attendance.user_id == staff_id
+        )
+    )
 
     # Now delete staff
-    db.delete(staff)
-    db.commit()
+    await db.delete(staff)
+    await db.commit()
+
+    dashboard_cache_invalidate()
 
     return {"message": "Staff deleted successfully"}
 
 @app.get("/attendance-percentage")
-def attendance_percentage(
+async def attendance_percentage(
+    request: Request,
+    response: Response,
     current_user: models.User = Depends(get_current_user),
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_async_db)
 ):
 
     if current_user.role != "admin":
         raise HTTPException(status_code=403, detail="Admins only")
 
-    staff_users = db.query(models.User).filter(
-        models.User.role == "staff"
-    ).all()
+    staff_users = (await db.execute(
+        select(models.User.id, models.User.full_name).where(
+            models.User.role == "staff"
+        )
+    )).all()
+
+    counts = (await db.execute(
+        select(
+            models.Attendance.user_id,
+            models.Attendance.status,
+            func.count().label("c")
+        ).group_by(
+            models.Attendance.user_id,
+            models.Attendance.status
+        )
+    )).all()
+
+    status_counts = {}
+    for user_id, status, c in counts:
+        status_counts.setdefault(user_id, {})[status] = c
 
     results = []
 
     for user in staff_users:
 
-        records = db.query(models.Attendance).filter(
-            models.Attendance.user_id == user.id
-        ).all()
+        user_counts = status_counts.get(user.id, {})
 
-        total_days = len(records)
+        total_days = sum(user_counts.values())
 
-        present_days = len([r for r in records if r.status == "Present"])
-        late_days = len([r for r in records if r.status == "Late"])
+        present_days = user_counts.get("Present", 0)
+        late_days = user_counts.get("Late", 0)
 
         attended_days = present_days + late_days
 
@@ -426,4 +711,4 @@ def attendance_percentage(
             "attendance_percentage": percentage
         })
 
-    return results
\ No newline at end of file
+    return conditional_response(request, response, results)
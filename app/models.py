@@ -1,4 +1,4 @@
-from sqlalchemy import Column, Integer, String, DateTime, Date, ForeignKey
+from sqlalchemy import Column, Integer, String, DateTime, Date, ForeignKey, Index
 from sqlalchemy.orm import relationship
 from datetime import datetime, timezone
 from .database import Base
@@ -21,8 +21,13 @@ class Attendance(Base):
 
     id = Column(Integer, primary_key=True, index=True)
     user_id = Column(Integer, ForeignKey("users.id"))
-    date = Column(Date)
+    date = Column(Date, index=True)
     check_in = Column(DateTime(timezone=True), default=lambda: datetime.now(timezone.utc))
     status = Column(String(20))  
 
     user = relationship("User")
+
+    # One attendance row per staff member per day
+    __table_args__ = (
+        Index("ix_attendance_user_date", "user_id", "date", unique=True),
+    )
@@ -0,0 +1,74 @@
+import base64
+import time
+
+import pytest
+from jose import JWTError, jwt
+
+from app.auth import ALGORITHM, SECRET_KEY, create_access_token, decode_access_token
+
+
+def _encode(claims, key=SECRET_KEY, algorithm=ALGORITHM):
+    return jwt.encode(claims, key, algorithm=algorithm)
+
+
+def _segment(data: bytes):
+    return base64.urlsafe_b64encode(data).rstrip(b"=").decode()
+
+
+def _accepts(decode, token):
+    try:
+        decode(token)
+    except JWTError:
+        return False
+    return True
+
+
+def _jose_decode(token):
+    return jwt.decode(token, SECRET_KEY, algorithms=[ALGORITHM])
+
+
+NOW = int(time.time())
+VALID = create_access_token({"sub": "staff@school.com", "role": "staff"})
+HEADER, PAYLOAD, SIGNATURE = VALID.split(".")
+FORGED_PAYLOAD = _segment(b'{"sub":"admin@school.com"}')
+NONE_HEADER = _segment(b'{"alg":"none"}')
+
+TOKENS = {
+    "valid": (VALID, True),
+    "numeric string exp": (_encode({"sub": "a", "exp": str(NOW + 60)}), True),
+    "issuer without expected issuer": (_encode({"sub": "a", "iss": "x"}), True),
+    "tampered signature": (f"{HEADER}.{PAYLOAD}.{SIGNATURE[:-2]}AA", False),
+    "tampered payload": (f"{HEADER}.{FORGED_PAYLOAD}.{SIGNATURE}", False),
+    "wrong key": (_encode({"sub": "a"}, key="other"), False),
+    "HS512": (_encode({"sub": "a"}, algorithm="HS512"), False),
+    "alg none": (f"{NONE_HEADER}.{PAYLOAD}.", False),
+    "one segment": ("abc", False),
+    "two segments": (f"{HEADER}.{PAYLOAD}", False),
+    "four segments": (f"{VALID}.{SIGNATURE}", False),
+    "bad base64": ("!!.??.**", False),
+    "non-ascii": ("é.é.é", False),
+    "expired": (_encode({"sub": "a", "exp": NOW - 60}), False),
+    "nbf in future": (_encode({"sub": "a", "nbf": NOW + 3600}), False),
+    "bool exp": (_encode({"sub": "a", "exp": True}), False),
+    "non-numeric exp": (_encode({"sub": "a", "exp": "soon"}), False),
+    "non-numeric iat": (_encode({"sub": "a", "iat": "then"}), False),
+    "non-string sub": (_encode({"sub": 5}), False),
+    "aud": (_encode({"sub": "a", "aud": "someone"}), False),
+    "non-string jti": (_encode({"sub": "a", "jti": 5}), False),
+    "at_hash": (_encode({"sub": "a", "at_hash": "x"}), False),
+}
+
+
+@pytest.mark.parametrize("name", TOKENS)
+def test_decode_access_token_matches_jwt_decode(name):
+    token, accepted = TOKENS[name]
+
+    assert _accepts(decode_access_token, token) is accepted
+    assert _accepts(_jose_decode, token) is accepted
+
+
+def test_decode_access_token_returns_claims():
+    payload = decode_access_token(VALID)
+
+    assert payload == _jose_decode(VALID)
+    assert payload["sub"] == "staff@school.com"